@@ -0,0 +1,53 @@
+"""Sparse timestamp index written next to LSL streams recorded by Pupil Capture
+
+The LSL Recorder plugin writes a `.csv.idx` file next to each recorded CSV file. It
+starts with `INDEX_MAGIC`, followed by `INDEX_ENTRY` records of the timestamp, byte
+offset, and data row number of a recorded sample. Only depends on the standard library.
+
+    for row in read_time_range("lsl_EEG_host_1234.csv", start=1020.0, stop=1022.5):
+        ...
+"""
+import bisect
+import csv
+import struct
+
+INDEX_FILE_EXTENSION = ".idx"
+INDEX_MAGIC = b"LSLIDX01"
+INDEX_ENTRY = struct.Struct("<dQQ")  # timestamp, byte offset, row number
+
+
+def read_index(index_path):
+    """Returns the (timestamp, byte offset, row number) entries of an index file"""
+    with open(index_path, "rb") as index_file:
+        content = index_file.read()
+    if not content.startswith(INDEX_MAGIC):
+        raise ValueError(f"Not a LSL recording index: {index_path}")
+    content = content[len(INDEX_MAGIC) :]
+    # ignore a truncated trailing entry, e.g. after a crash during recording
+    content = content[: len(content) - len(content) % INDEX_ENTRY.size]
+    return list(INDEX_ENTRY.iter_unpack(content))
+
+
+def read_time_range(csv_path, start, stop):
+    """Yields recorded CSV rows with `start <= timestamp < stop`
+
+    Uses the sidecar index written during the recording to seek close to `start`
+    instead of scanning the file from its beginning. Assumes monotonic timestamps.
+    """
+    entries = read_index(csv_path + INDEX_FILE_EXTENSION)
+    if not entries:
+        return
+    entry_timestamps = [timestamp for timestamp, _, _ in entries]
+    # last entry strictly before `start`, rows before an entry may share its timestamp
+    entry_idx = max(bisect.bisect_left(entry_timestamps, start) - 1, 0)
+    _, byte_offset, _ = entries[entry_idx]
+    with open(csv_path, newline="") as csv_file:
+        csv_file.seek(byte_offset)
+        for row in csv.reader(csv_file):
+            if not row:
+                continue
+            timestamp = float(row[0])
+            if timestamp >= stop:
+                break
+            if timestamp >= start:
+                yield row
@@ -0,0 +1,224 @@
+"""Loads LSL streams recorded by the Pupil Capture LSL Recorder plugin
+
+Streams are converted to a binary cache on first access and memory-mapped afterwards.
+Time-range queries use a binary search on the timestamp column. Does not depend on
+Pupil Capture or pylsl.
+
+    recording = LSLRecording("~/recordings/2023_01_01/000")
+    for stream in recording:
+        print(stream.name, stream.channel_labels)
+    eeg = recording.stream("EEG")
+    timestamps, samples = eeg.time_range(start=1020.0, stop=1022.5)
+
+The `.csv.idx` sidecar index (see `pupil_capture_lsl_index`) reads a time range
+directly from the CSV file without any conversion, which suits one-off epoch
+extraction. This loader converts each stream once and suits repeated analysis of the
+same recording. `RecordedStream.csv_rows_in_time_range()` gives access to the former.
+"""
+import csv
+import glob
+import os
+import typing as T
+import warnings
+
+import numpy as np
+from pupil_capture_lsl_index import read_time_range
+
+CACHE_DIR = os.path.join("offline_data", "lsl")
+FILE_NAME_PREFIX = "lsl_"
+FILE_NAME_EXTENSION = ".csv"
+
+TIMESTAMP_COLUMN = "timestamp"
+DEJITTERED_TIMESTAMP_COLUMN = "timestamp_dejittered"
+WORLD_INDEX_COLUMN = "world_index"
+# columns added by the recorder in addition to the stream's channels
+AUXILIARY_COLUMNS = (DEJITTERED_TIMESTAMP_COLUMN, WORLD_INDEX_COLUMN)
+
+
+class RecordedStream:
+    """Single stream recorded to `lsl_<name>_<hostname>_<source_id>.csv`
+
+    The file name is split at the last two underscores, i.e. the stream name may contain
+    underscores but the hostname and source id must not.
+
+    Columns added by the recorder, i.e. de-jittered timestamps and world frame indices,
+    are exposed separately from the stream's channels. Samples are loaded as float64 if
+    all channels are numeric and as strings otherwise, e.g. for marker streams.
+    """
+
+    def __init__(self, csv_path: str, cache_dir: str) -> None:
+        self.csv_path = csv_path
+        file_name = os.path.basename(csv_path)
+        file_stem = file_name[len(FILE_NAME_PREFIX) : -len(FILE_NAME_EXTENSION)]
+        self.name, self.hostname, self.source_id = file_stem.rsplit("_", 2)
+        with open(csv_path, newline="") as csv_file:
+            self.columns: T.List[str] = next(csv.reader(csv_file), [])
+        self._time_columns = [
+            column
+            for column in self.columns
+            if column == TIMESTAMP_COLUMN or column in AUXILIARY_COLUMNS
+        ]
+        # one contiguous file per time column, binary searches only touch what they need
+        self.time_cache_paths = {
+            column: os.path.join(cache_dir, f"{file_stem}_{column}.npy")
+            for column in self._time_columns
+        }
+        self.samples_cache_path = os.path.join(cache_dir, file_stem + "_samples.npy")
+        self._time_data = None
+        self._samples = None
+
+    def __repr__(self) -> str:
+        return f"<RecordedStream {self.name} ({self.hostname}) {self.source_id}>"
+
+    @property
+    def channel_labels(self) -> T.List[str]:
+        return [column for column in self.columns if column not in self._time_columns]
+
+    @property
+    def timestamps(self) -> np.ndarray:
+        return self._time_column(TIMESTAMP_COLUMN)
+
+    @property
+    def dejittered_timestamps(self) -> T.Optional[np.ndarray]:
+        """De-jittered timestamps, None if they were not recorded as extra column"""
+        return self._time_column(DEJITTERED_TIMESTAMP_COLUMN)
+
+    @property
+    def world_indices(self) -> T.Optional[np.ndarray]:
+        """Index of the closest world frame, None if it was not recorded as extra column
+
+        -1 if no world frames were observed during the recording.
+        """
+        return self._time_column(WORLD_INDEX_COLUMN)
+
+    @property
+    def samples(self) -> np.ndarray:
+        """Memory-mapped array of the channel values, one row per sample"""
+        self._load()
+        return self._samples
+
+    def time_range(self, start: float, stop: float) -> T.Tuple[np.ndarray, np.ndarray]:
+        """Returns timestamps and samples with `start <= timestamp < stop`
+
+        Requires monotonic timestamps.
+        """
+        timestamps = self.timestamps
+        start_idx, stop_idx = np.searchsorted(timestamps, (start, stop))
+        return timestamps[start_idx:stop_idx], self.samples[start_idx:stop_idx]
+
+    def csv_rows_in_time_range(self, start: float, stop: float):
+        """Yields the raw CSV rows with `start <= timestamp < stop` via the index"""
+        yield from read_time_range(self.csv_path, start, stop)
+
+    def _time_column(self, column: str) -> T.Optional[np.ndarray]:
+        if column not in self._time_columns:
+            return None
+        self._load()
+        return self._time_data[column]
+
+    def _load(self):
+        if self._samples is not None:
+            return
+        if not self._is_cache_valid():
+            self._convert_to_cache()
+        self._time_data = {
+            column: np.load(cache_path, mmap_mode="r")
+            for column, cache_path in self.time_cache_paths.items()
+        }
+        self._samples = np.load(self.samples_cache_path, mmap_mode="r")
+
+    def _is_cache_valid(self) -> bool:
+        csv_mtime = os.path.getmtime(self.csv_path)
+        for cache_path in (*self.time_cache_paths.values(), self.samples_cache_path):
+            if not os.path.exists(cache_path):
+                return False
+            if os.path.getmtime(cache_path) < csv_mtime:
+                return False
+        return True
+
+    def _convert_to_cache(self):
+        time_indices = [self.columns.index(column) for column in self._time_columns]
+        channel_indices = [
+            idx
+            for idx, column in enumerate(self.columns)
+            if column not in self._time_columns
+        ]
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")  # empty recordings are valid
+                data = np.loadtxt(
+                    self.csv_path,
+                    delimiter=",",
+                    skiprows=1,
+                    ndmin=2,
+                    dtype=np.float64,
+                )
+            if not data.size:
+                data = np.empty((0, len(self.columns)), dtype=np.float64)
+            time_data = data[:, time_indices]
+            samples = data[:, channel_indices]
+        except ValueError:
+            # non-numeric channels, e.g. marker streams
+            time_data, samples = self._read_with_string_channels(
+                time_indices, channel_indices
+            )
+        os.makedirs(os.path.dirname(self.samples_cache_path), exist_ok=True)
+        for column_idx, column in enumerate(self._time_columns):
+            column_data = np.ascontiguousarray(time_data[:, column_idx])
+            if column == WORLD_INDEX_COLUMN:
+                column_data = column_data.astype(np.int64)
+            _save_atomically(self.time_cache_paths[column], column_data)
+        _save_atomically(self.samples_cache_path, samples)
+
+    def _read_with_string_channels(self, time_indices, channel_indices):
+        with open(self.csv_path, newline="") as csv_file:
+            reader = csv.reader(csv_file)
+            next(reader, None)  # header
+            rows = [row for row in reader if row]
+        time_data = np.array(
+            [[float(row[idx]) for idx in time_indices] for row in rows],
+            dtype=np.float64,
+        ).reshape(len(rows), len(time_indices))
+        samples = np.array(
+            [[row[idx] for idx in channel_indices] for row in rows], dtype=str
+        ).reshape(len(rows), len(channel_indices))
+        return time_data, samples
+
+
+class LSLRecording:
+    """All LSL streams recorded within a Pupil Capture recording directory"""
+
+    def __init__(self, rec_dir: str) -> None:
+        rec_dir = os.path.expanduser(rec_dir)
+        cache_dir = os.path.join(rec_dir, CACHE_DIR)
+        pattern = os.path.join(rec_dir, f"{FILE_NAME_PREFIX}*{FILE_NAME_EXTENSION}")
+        self.streams = [
+            RecordedStream(csv_path, cache_dir)
+            for csv_path in sorted(glob.glob(pattern))
+        ]
+
+    def __iter__(self) -> T.Iterator[RecordedStream]:
+        return iter(self.streams)
+
+    def __len__(self) -> int:
+        return len(self.streams)
+
+    def stream(self, name: str, hostname: T.Optional[str] = None) -> RecordedStream:
+        """Returns the stream with `name`, optionally recorded from `hostname`"""
+        matches = [
+            stream
+            for stream in self.streams
+            if stream.name == name and hostname in (None, stream.hostname)
+        ]
+        if not matches:
+            raise KeyError(f"No recorded stream named {name}")
+        if len(matches) > 1:
+            raise ValueError(f"Multiple recorded streams named {name}: {matches}")
+        return matches[0]
+
+
+def _save_atomically(file_path: str, array: np.ndarray):
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "wb") as cache_file:
+        np.save(cache_file, array)
+    os.replace(tmp_path, file_path)
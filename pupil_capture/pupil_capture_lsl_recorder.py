@@ -1,16 +1,49 @@
 import csv
 import itertools
+import json
 import logging
 import os
+import threading
+import time
 import typing as T
 
+import numpy as np
 import pylsl as lsl
 from plugin import Plugin
+from pupil_capture_lsl_index import INDEX_ENTRY, INDEX_FILE_EXTENSION, INDEX_MAGIC
 from pyglui import ui
 from version_utils import parse_version
 
 VERSION = "1.0"
 
+INDEX_INTERVAL_ROWS = 1000
+INDEX_INTERVAL_SECONDS = 1.0
+
+INTEGRITY_SUMMARY_FILE_NAME = "lsl_integrity_summary.json"
+GAP_FACTOR = 2.0  # intervals longer than this many nominal intervals count as gaps
+GAP_MIN_SECONDS = 0.1  # tolerates chunk jitter, shorter intervals never count as gaps
+LONG_GAP_SECONDS = 1.0
+
+DEJITTER_OFF = "off"
+DEJITTER_ALONGSIDE = "alongside"
+DEJITTER_REPLACE = "replace"
+# the de-jittering fit restarts at intervals longer than both, similar to pyxdf
+DEJITTER_SEGMENT_MIN_SECONDS = 1.0
+DEJITTER_SEGMENT_MIN_SAMPLES = 500
+
+WORLD_TIMESTAMPS_FILE_NAME = "world_timestamps.npy"
+# frames observed after `recording.should_start` without `recording.started` following
+MAX_PENDING_WORLD_FRAMES = 30
+# samples newer than the latest world frame are written anyway once they are this old
+WORLD_INDEX_MAX_HOLD_SECONDS = 1.0
+
+RECORDER_WORKER_COUNT = min(4, os.cpu_count() or 1)
+WORKER_INTERVAL_SECONDS = 0.005
+REBALANCE_INTERVAL_SECONDS = 5.0
+STATS_INTERVAL_SECONDS = 1.0
+# CPU time of the calling thread, falls back to wall time on Python < 3.7
+_thread_time = getattr(time, "thread_time", time.perf_counter)
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
@@ -23,18 +56,37 @@ class Pupil_LSL_Recorder(Plugin):
 
     # -- Plugin callbacks
 
-    def __init__(self, g_pool, streams_should_record=None):
+    def __init__(
+        self,
+        g_pool,
+        streams_should_record=None,
+        record_local_relay_streams=False,
+        dejitter_timestamps=DEJITTER_OFF,
+        record_world_index=False,
+    ):
         super().__init__(g_pool)
         if g_pool.version < parse_version("3.4.59"):
             self.icon_chr = "RC"  # no icon custimization available yet
         self._is_recording = False
         self._streams = {}
         self._streams_should_record = streams_should_record or {}
+        self._record_local_relay_streams = record_local_relay_streams
+        self.dejitter_timestamps = dejitter_timestamps
+        self.record_world_index = record_world_index
         self._stream_recorders = []
+        self._rec_dir = None
+        self._world_frames = None
+        self._workers = []
+        self._next_rebalance_time = 0.0
         self._resolver = lsl.ContinuousResolver()
 
     def get_init_dict(self):
-        return {"streams_should_record": self._streams_should_record}
+        return {
+            "streams_should_record": self._streams_should_record,
+            "record_local_relay_streams": self._record_local_relay_streams,
+            "dejitter_timestamps": self.dejitter_timestamps,
+            "record_world_index": self.record_world_index,
+        }
 
     # -- Plugin callbacks
 
@@ -51,30 +103,102 @@ class Pupil_LSL_Recorder(Plugin):
         self.menu.append(
             ui.Info_Text(
                 "Records LSL streams to corresponding CSV files. File name format: "
-                "`lsl_<name>_<hostname>_<source_id>.csv`"
+                "`lsl_<name>_<hostname>_<source_id>.csv`. A sparse timestamp index "
+                "is written next to each file (`.csv.idx`)."
             )
         )
+        self._settings_menu = [
+            ui.Switch(
+                "record_local_relay_streams",
+                self,
+                label="Record streams of the Pupil LSL Relay plugin",
+            ),
+            ui.Info_Text(
+                "Streams published by the Pupil LSL Relay plugin in this Capture "
+                "instance are recorded directly from Capture's data instead of via "
+                "the network. Capture records this data natively, too."
+            ),
+            ui.Selector(
+                "dejitter_timestamps",
+                self,
+                selection=[DEJITTER_OFF, DEJITTER_ALONGSIDE, DEJITTER_REPLACE],
+                labels=["Off", "Additional column", "Replace timestamps"],
+                label="De-jitter timestamps",
+            ),
+            ui.Info_Text(
+                "Smoothes the timestamps of streams with regular sampling rate by "
+                "fitting a linear model. The fit restarts after gaps."
+            ),
+            ui.Switch(
+                "record_world_index",
+                self,
+                label="Record world frame index",
+            ),
+            ui.Info_Text(
+                "Adds a `world_index` column with the index of the closest world "
+                "video frame to each recorded sample."
+            ),
+        ]
+        self.menu.extend(self._settings_menu)
         self._streams_menu = ui.Growing_Menu("Streams to record")
         self.menu.append(self._streams_menu)
+        self._integrity_menu = ui.Growing_Menu("Recording integrity")
+        self.menu.append(self._integrity_menu)
+        self._performance_menu = ui.Growing_Menu("Recording performance")
+        self.menu.append(self._performance_menu)
 
     def deinit_ui(self):
         self.remove_menu()
         del self._streams_menu[:]
         self._streams_menu = None
+        del self._integrity_menu[:]
+        self._integrity_menu = None
+        del self._performance_menu[:]
+        self._performance_menu = None
+        self._settings_menu = None
 
     def on_notify(self, notification):
-        if notification["subject"] == "recording.started":
+        if notification["subject"] == "recording.should_start":
+            # Capture's recorder starts writing world frames before announcing the
+            # started recording. Observe frames from here on to stay aligned.
+            if self.record_world_index and not self._is_recording:
+                self._world_frames = WorldFrameTimestamps()
+        elif notification["subject"] == "recording.started":
             self.start_recording(notification["rec_path"])
         elif notification["subject"] == "recording.stopped":
             self.stop_recording()
+            self._world_frames = None  # in case the recording never started
 
     def recent_events(self, events):
+        if self._world_frames is not None and "frame" in events:
+            self._world_frames.append(events["frame"].timestamp)
+            if (
+                not self._is_recording
+                and self._world_frames.timestamps.size > MAX_PENDING_WORLD_FRAMES
+            ):
+                logger.debug("recording did not start, discarding world frames")
+                self._world_frames = None
         if self._stream_recorders:
-            for recorder in self._stream_recorders:
-                recorder.record_available_data()
+            if time.monotonic() >= self._next_rebalance_time:
+                self._rebalance_workers()
         else:
             self.resolve_lsl_streams()
 
+    def cleanup(self):
+        # menus are gone by now, only stop recorder workers and close open files
+        if self._is_recording:
+            self._finish_recording()
+            self._is_recording = False
+
+    @property
+    def record_local_relay_streams(self):
+        return self._record_local_relay_streams
+
+    @record_local_relay_streams.setter
+    def record_local_relay_streams(self, value):
+        self._record_local_relay_streams = value
+        self._streams = {}  # forces streams menu to be rebuilt on next resolve
+
     # -- Core logic
 
     def start_recording(self, directory):
@@ -83,22 +207,54 @@ class Pupil_LSL_Recorder(Plugin):
             return
         logger.debug("starting recording")
         self._set_recording_state(True)
+        if not self.record_world_index:
+            self._world_frames = None
+        elif self._world_frames is None:
+            self._world_frames = WorldFrameTimestamps()
+        local_outlets = self._local_relay_outlets()
         self._stream_recorders = [
-            StreamRecorder.setup(stream, directory, self.g_pool.get_timestamp)
+            StreamRecorder.setup_local(
+                local_outlets[stream.source_id()],
+                stream.source_id(),
+                directory,
+                world_frames=self._world_frames,
+            )
+            if stream.source_id() in local_outlets
+            else StreamRecorder.setup(
+                stream,
+                directory,
+                self.g_pool.get_timestamp,
+                dejitter=self.dejitter_timestamps,
+                world_frames=self._world_frames,
+            )
             for stream in self.streams_to_record()
         ]
+        self._rec_dir = directory
         logger.debug(f"started recorders: {self._stream_recorders}")
+        del self._integrity_menu[:]
+        del self._performance_menu[:]
+        for recorder in self._stream_recorders:
+            self._add_recorder_status(recorder)
+        self._start_workers()
 
     def stop_recording(self):
         if not self._is_recording:
             logger.debug("stop_recording() called although recording was not running")
             return
+        self._finish_recording()
+        self._set_recording_state(False)
+        logger.debug("recording stopped")
+
+    def _finish_recording(self):
         logger.debug(f"stopping recorders: {self._stream_recorders}")
+        self._stop_workers()
         for recorder in self._stream_recorders:
             recorder.close()
+        self._write_integrity_summary()
+        if self._world_frames is not None:
+            self._check_world_frames()
+            self._world_frames = None
         del self._stream_recorders[:]
-        self._set_recording_state(False)
-        logger.debug("recording stopped")
 
     def streams_to_record(self):
         if not self._is_recording:
@@ -111,6 +267,13 @@ class Pupil_LSL_Recorder(Plugin):
 
     def resolve_lsl_streams(self):
         streams = {stream.source_id(): stream for stream in self._resolver.results()}
+        if not self._record_local_relay_streams:
+            local_outlets = self._local_relay_outlets()
+            streams = {
+                source_id: stream
+                for source_id, stream in streams.items()
+                if source_id not in local_outlets
+            }
         stream_ids_new = set(streams) - set(self._streams)
         stream_ids_removed = set(self._streams) - set(streams)
         self._streams = streams
@@ -129,14 +292,112 @@ class Pupil_LSL_Recorder(Plugin):
             for stream_source_id, label in zip(self._streams, stream_labels):
                 self._add_stream(stream_source_id, label)
 
+    def _local_relay_outlets(self):
+        """Maps source ids of streams published by this Capture instance to outlets"""
+        return {
+            source_id: outlet
+            for plugin in self.g_pool.plugins
+            if type(plugin).__name__ == "Pupil_LSL_Relay"
+            for outlet in plugin.outlets
+            for source_id in outlet.source_ids()
+        }
+
     def _set_recording_state(self, state):
         self._is_recording = state
-        for button in self._streams_menu:
-            button.read_only = state
+        if self._settings_menu is not None:
+            for element in self._settings_menu:
+                element.read_only = state
+        if self._streams_menu is not None:
+            for button in self._streams_menu:
+                button.read_only = state
 
     def _add_stream(self, stream_source_id, label):
         self._streams_menu.append(ui.Switch(label, self._streams_should_record))
 
+    def _start_workers(self):
+        worker_count = min(RECORDER_WORKER_COUNT, len(self._stream_recorders))
+        self._workers = [
+            RecorderWorker(name=f"LSL recorder worker {i}") for i in range(worker_count)
+        ]
+        self._rebalance_workers()
+        for worker in self._workers:
+            worker.start()
+        logger.debug(f"started {worker_count} recorder workers")
+
+    def _stop_workers(self):
+        for worker in self._workers:
+            worker.stop()
+        for worker in self._workers:
+            worker.join()
+        del self._workers[:]
+
+    def _rebalance_workers(self):
+        """Assigns the recorders with the highest CPU load to the least busy workers"""
+        self._next_rebalance_time = time.monotonic() + REBALANCE_INTERVAL_SECONDS
+        if not self._workers:
+            return
+        assignments = [[] for _ in self._workers]
+        loads = [0.0 for _ in self._workers]
+        recorders = sorted(
+            self._stream_recorders, key=lambda r: r.stats.cpu_load, reverse=True
+        )
+        for recorder in recorders:
+            worker_idx = min(
+                range(len(self._workers)),
+                key=lambda idx: (loads[idx], len(assignments[idx])),
+            )
+            assignments[worker_idx].append(recorder)
+            loads[worker_idx] += recorder.stats.cpu_load
+            recorder.stats.worker_name = self._workers[worker_idx].name
+        for worker, assigned_recorders in zip(self._workers, assignments):
+            worker.assign(assigned_recorders)
+
+    def _add_recorder_status(self, recorder):
+        for menu, status_context in (
+            (self._integrity_menu, recorder.integrity),
+            (self._performance_menu, recorder.stats),
+        ):
+            status = ui.Text_Input(
+                "status",
+                status_context,
+                label=_stream_label(recorder.info),
+                setter=lambda _: None,
+            )
+            status.read_only = True
+            menu.append(status)
+
+    def _check_world_frames(self):
+        file_path = os.path.join(self._rec_dir, WORLD_TIMESTAMPS_FILE_NAME)
+        if not os.path.exists(file_path):
+            return
+        recorded = np.load(file_path)
+        observed = self._world_frames.timestamps
+        count = min(recorded.size, observed.size)
+        if not np.array_equal(recorded[:count], observed[:count]):
+            logger.warning(
+                f"World frames observed during the recording do not match "
+                f"{WORLD_TIMESTAMPS_FILE_NAME}. The `world_index` column of the "
+                "recorded LSL streams might be misaligned."
+            )
+
+    def _write_integrity_summary(self):
+        summary = [
+            {
+                "name": recorder.info.name(),
+                "hostname": recorder.info.hostname(),
+                "source_id": recorder.info.source_id(),
+                **recorder.integrity.summary(),
+                "cpu_time": recorder.stats.cpu_time,
+                "bytes_written": recorder.stats.bytes_written,
+                "error": recorder.stats.error,
+            }
+            for recorder in self._stream_recorders
+        ]
+        file_path = os.path.join(self._rec_dir, INTEGRITY_SUMMARY_FILE_NAME)
+        with open(file_path, "w") as summary_file:
+            json.dump(summary, summary_file, indent=4)
+        logger.debug(f"wrote integrity summary to {file_path}")
+
 
 def _stream_label(stream):
     return f"{stream.name()} ({stream.hostname()})"
@@ -147,25 +408,70 @@ class StreamRecorder(T.NamedTuple):
     inlet: lsl.StreamInlet
     file_handle: T.TextIO
     csv_writer: csv.writer
-    pupil_clock: T.Callable[[], float]
+    # None if the inlet provides timestamps in Pupil time already
+    pupil_clock: T.Optional[T.Callable[[], float]]
+    stats: "RecorderStats"
+    index: "StreamIndexWriter"
+    integrity: "StreamIntegrity"
+    # None if timestamps are not de-jittered, see DEJITTER_* for modes
+    dejitterer: T.Optional["TimestampDejitterer"]
+    dejitter: str
+    # None if no world index column is recorded
+    world_index: T.Optional["WorldIndexMatcher"]
 
     @staticmethod
-    def setup(stream, rec_dir, pupil_clock, timeout=1.0):
+    def setup(
+        stream,
+        rec_dir,
+        pupil_clock,
+        dejitter=DEJITTER_OFF,
+        world_frames=None,
+        timeout=1.0,
+    ):
         inlet = lsl.StreamInlet(stream)
         info = inlet.info(timeout=timeout)
         inlet.time_correction(timeout=timeout)
         inlet.open_stream(timeout=timeout)
-        file_name = f"lsl_{stream.name()}_{stream.hostname()}_{stream.source_id()}.csv"
+        return StreamRecorder._setup(
+            info, inlet, rec_dir, pupil_clock, dejitter, world_frames
+        )
+
+    @staticmethod
+    def setup_local(outlet, source_id, rec_dir, world_frames=None):
+        """Records a stream of an in-process Pupil LSL Relay outlet"""
+        inlet = LocalOutletInlet(outlet, source_id)
+        info = outlet.stream_info(source_id)
+        return StreamRecorder._setup(
+            info, inlet, rec_dir, pupil_clock=None, world_frames=world_frames
+        )
+
+    @staticmethod
+    def _setup(
+        info, inlet, rec_dir, pupil_clock, dejitter=DEJITTER_OFF, world_frames=None
+    ):
+        file_name = f"lsl_{info.name()}_{info.hostname()}_{info.source_id()}.csv"
         file_path = os.path.join(rec_dir, file_name)
         logger.debug(f"opening file at {file_path}")
         file_handle = open(file_path, "w")
         csv_writer = csv.writer(file_handle)
+        index = StreamIndexWriter(file_path + INDEX_FILE_EXTENSION)
+        dejitterer = None
+        if dejitter != DEJITTER_OFF and info.nominal_srate() > 0:
+            dejitterer = TimestampDejitterer(info.nominal_srate())
         recorder = StreamRecorder(
             info=info,
             inlet=inlet,
             file_handle=file_handle,
             csv_writer=csv_writer,
             pupil_clock=pupil_clock,
+            index=index,
+            stats=RecorderStats(),
+            integrity=StreamIntegrity(info.nominal_srate()),
+            dejitterer=dejitterer,
+            dejitter=dejitter,
+            world_index=(
+                None if world_frames is None else WorldIndexMatcher(world_frames)
+            ),
         )
         recorder._record_header()
         recorder.record_available_data()
@@ -174,33 +480,97 @@ class StreamRecorder(T.NamedTuple):
 
     def record_available_data(self):
         try:
-            pupil_lsl_offset = self.pupil_clock() - lsl.local_clock()
-            pupil_lsl_offset += self.inlet.time_correction()
+            if self.pupil_clock is None:
+                pupil_lsl_offset = 0.0
+            else:
+                pupil_lsl_offset = self.pupil_clock() - lsl.local_clock()
+                pupil_lsl_offset += self.inlet.time_correction()
             while self._record_chunk(pupil_lsl_offset):
                 pass  # loop breaks as soon as available data has been processed
         except lsl.LostError:
             logger.warning(f"Lost connection to LSL stream: {_stream_label(self.info)}")
 
+    def drain(self):
+        """Records available data and accounts for its CPU time
+
+        Safe to call from any thread. Used by `RecorderWorker`s. After the first error,
+        e.g. a full disk, the error is stored in `stats` and the recorder is no longer
+        drained, so the error is raised only once.
+        """
+        with self.stats.lock:
+            if self.stats.error is not None:
+                return
+            cpu_start = _thread_time()
+            try:
+                self.record_available_data()
+                self.stats.update(_thread_time() - cpu_start, self.file_handle)
+            except Exception as err:
+                self.stats.error = str(err) or type(err).__name__
+                raise
+
     def close(self):
-        self.record_available_data()
-        self.file_handle.close()
-        self.inlet.close_stream()
+        with self.stats.lock:
+            if self.stats.error is None:
+                self.record_available_data()
+                if self.world_index is not None:
+                    self._write_rows(*self.world_index.flush())
+                self.stats.update(0.0, self.file_handle, force=True)
+            self.file_handle.close()
+            self.index.close()
+            self.inlet.close_stream()
         logger.debug(f"{self} closed")
 
     def _record_header(self):
         self.csv_writer.writerow(self._csv_header())
 
     def _record_chunk(self, timestamp_offset):
-        chunk = self.inlet.pull_chunk()
-        rows = [
-            itertools.chain((ts + timestamp_offset,), datum)
-            for datum, ts in zip(*chunk)
-        ]
+        data, timestamps = self.inlet.pull_chunk()
+        if not timestamps:
+            return 0
+        timestamps = np.asarray(timestamps, dtype=np.float64) + timestamp_offset
+        self.integrity.update(timestamps)
+        timestamp_columns = [timestamps]
+        if self.dejitterer is not None:
+            dejittered = self.dejitterer.dejitter(timestamps)
+            if self.dejitter == DEJITTER_REPLACE:
+                timestamp_columns = [dejittered]
+            else:
+                timestamp_columns.append(dejittered)
+        timestamp_rows = list(zip(*(column.tolist() for column in timestamp_columns)))
+        if self.world_index is None:
+            self._write_rows(timestamp_rows, data)
+        else:
+            self._write_rows(
+                *self.world_index.match(timestamp_columns[0], timestamp_rows, data)
+            )
+        return len(timestamps)
+
+    def _write_rows(self, timestamp_rows, data, world_indices=None):
+        if not timestamp_rows:
+            return
+        if self.index.is_due(timestamp_rows[0][0]):
+            # tell() flushes the write buffer, only call it for sparse index entries
+            self.index.add_entry(timestamp_rows[0][0], self.file_handle.tell())
+        if world_indices is None:
+            rows = (
+                itertools.chain(ts, datum) for ts, datum in zip(timestamp_rows, data)
+            )
+        else:
+            rows = (
+                itertools.chain(ts, (world_index,), datum)
+                for ts, world_index, datum in zip(
+                    timestamp_rows, world_indices.tolist(), data
+                )
+            )
         self.csv_writer.writerows(rows)
-        return len(rows)
+        self.index.advance(len(timestamp_rows))
 
     def _csv_header(self):
         yield "timestamp"
+        if self.dejitterer is not None and self.dejitter == DEJITTER_ALONGSIDE:
+            yield "timestamp_dejittered"
+        if self.world_index is not None:
+            yield "world_index"
         labels = list(self._channel_labels())
         if not labels:
             labels = (f"channel_{i}" for i in range(self.info.channel_count()))
@@ -212,3 +582,405 @@ class StreamRecorder(T.NamedTuple):
         while not channel.empty():
             yield channel.child_value("label")
             channel = channel.next_sibling()
+
+
+class LocalOutletInlet:
+    """Inlet replacement receiving samples directly from a Pupil LSL Relay outlet
+
+    Avoids serializing and sending the relayed data through the LSL network stack if
+    the relay and the recorder run in the same Capture instance. Timestamps are in
+    Pupil time.
+    """
+
+    def __init__(self, outlet, source_id):
+        self._outlet = outlet
+        self._source_id = source_id
+        self._samples = []
+        self._timestamps = []
+        # samples are received in the world thread but pulled by recorder workers
+        self._lock = threading.Lock()
+        outlet.add_local_consumer(self._receive)
+
+    def pull_chunk(self):
+        with self._lock:
+            chunk = self._samples, self._timestamps
+            self._samples = []
+            self._timestamps = []
+        return chunk
+
+    def close_stream(self):
+        self._outlet.remove_local_consumer(self._receive)
+
+    def _receive(self, source_id, samples, timestamps):
+        if source_id == self._source_id:
+            with self._lock:
+                self._samples.extend(samples)
+                self._timestamps.extend(timestamps)
+
+
+class RecorderWorker(threading.Thread):
+    """Periodically drains the stream recorders assigned to it
+
+    Recorders can be reassigned at any time. Each recorder is drained under its own
+    lock, so a recorder moved between workers is never drained concurrently.
+    """
+
+    def __init__(self, name):
+        super().__init__(name=name, daemon=True)
+        self._recorders = []
+        self._should_stop = threading.Event()
+
+    def assign(self, recorders):
+        self._recorders = list(recorders)  # replaced atomically
+
+    def stop(self):
+        self._should_stop.set()
+
+    def run(self):
+        while not self._should_stop.wait(WORKER_INTERVAL_SECONDS):
+            for recorder in self._recorders:
+                try:
+                    recorder.drain()
+                except Exception:
+                    logger.exception(
+                        f"Error recording {_stream_label(recorder.info)}. "
+                        "Stopped recording this stream."
+                    )
+
+
+class RecorderStats:
+    """CPU time and write throughput of a stream recorder"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.worker_name = "-"
+        self.cpu_time = 0.0
+        self.cpu_load = 0.0  # CPU seconds per second
+        self.bytes_written = 0
+        self.bytes_per_second = 0.0
+        self.error = None  # set once the recorder failed and stopped recording
+        self._window_start = time.monotonic()
+        self._window_cpu_time = 0.0
+
+    def update(self, cpu_time, file_handle, force=False):
+        self.cpu_time += cpu_time
+        self._window_cpu_time += cpu_time
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < STATS_INTERVAL_SECONDS and not force:
+            return
+        # tell() flushes the write buffer, only call it once per interval
+        bytes_written = file_handle.tell()
+        if elapsed > 0.0:
+            self.cpu_load = self._window_cpu_time / elapsed
+            self.bytes_per_second = (bytes_written - self.bytes_written) / elapsed
+        self.bytes_written = bytes_written
+        self._window_start = now
+        self._window_cpu_time = 0.0
+
+    @property
+    def status(self):
+        if self.error is not None:
+            return f"stopped after error: {self.error} ({self.worker_name})"
+        return (
+            f"{self.cpu_load * 1000:.1f} ms CPU/s, "
+            f"{self.bytes_per_second / 1024:.1f} KiB/s ({self.worker_name})"
+        )
+
+
+class StreamIntegrity:
+    """Accounts for gaps and rate deviations of a recorded stream
+
+    Inter-sample intervals longer than `GAP_FACTOR` nominal intervals, but at least
+    `GAP_MIN_SECONDS`, count as gaps. Missing samples are estimated from the time span
+    covered by the received samples, so late chunks and the short intervals following
+    them cancel out. The span restarts if timestamps jump backwards by more than the gap
+    threshold, e.g. after the sending device restarted. Gap detection is skipped for streams with irregular
+    sampling rate.
+    """
+
+    def __init__(self, nominal_srate):
+        self.nominal_srate = nominal_srate
+        self.sample_count = 0
+        self.gap_count = 0
+        self.long_gap_count = 0
+        self._first_timestamp = None
+        self._last_timestamp = None
+        self._gap_threshold = 0.0
+        if nominal_srate > 0:
+            self._gap_threshold = max(GAP_FACTOR / nominal_srate, GAP_MIN_SECONDS)
+        self._finished_segments_missing_count = 0
+        self._start_segment()
+
+    def update(self, timestamps):
+        if self._last_timestamp is None:
+            self._first_timestamp = timestamps[0]
+            intervals = np.diff(timestamps, prepend=timestamps[0])
+        else:
+            intervals = np.diff(timestamps, prepend=self._last_timestamp)
+        if self.nominal_srate > 0:
+            gaps = intervals[intervals > self._gap_threshold]
+            self.gap_count += gaps.size
+            self.long_gap_count += int(np.count_nonzero(gaps > LONG_GAP_SECONDS))
+            segment_start = 0
+            for reset_idx in np.flatnonzero(intervals < -self._gap_threshold).tolist():
+                self._add_to_segment(timestamps[segment_start:reset_idx])
+                self._finished_segments_missing_count += self._segment_missing_count()
+                self._start_segment()
+                segment_start = reset_idx
+            self._add_to_segment(timestamps[segment_start:])
+        self.sample_count += timestamps.size
+        self._last_timestamp = timestamps[-1]
+
+    @property
+    def missing_sample_count(self):
+        return self._finished_segments_missing_count + self._segment_missing_count()
+
+    def _start_segment(self):
+        self._segment_first_timestamp = None
+        self._segment_last_timestamp = None
+        self._segment_sample_count = 0
+
+    def _add_to_segment(self, timestamps):
+        if not timestamps.size:
+            return
+        if self._segment_first_timestamp is None:
+            self._segment_first_timestamp = timestamps[0]
+        self._segment_sample_count += timestamps.size
+        self._segment_last_timestamp = timestamps[-1]
+
+    def _segment_missing_count(self):
+        if self._segment_first_timestamp is None:
+            return 0
+        span = self._segment_last_timestamp - self._segment_first_timestamp
+        expected_count = int(round(span * self.nominal_srate)) + 1
+        return max(expected_count - self._segment_sample_count, 0)
+
+    @property
+    def effective_srate(self):
+        if self.sample_count < 2 or self._last_timestamp <= self._first_timestamp:
+            return 0.0
+        duration = self._last_timestamp - self._first_timestamp
+        return float((self.sample_count - 1) / duration)
+
+    @property
+    def status(self):
+        status = f"{self.sample_count} samples, {self.effective_srate:.1f} Hz"
+        if self.nominal_srate > 0:
+            status += (
+                f" (nominal {self.nominal_srate:.1f} Hz), {self.gap_count} gaps "
+                f"({self.long_gap_count} > {LONG_GAP_SECONDS:.0f} s), "
+                f"~{self.missing_sample_count} samples missing"
+            )
+        return status
+
+    def summary(self):
+        return {
+            "nominal_srate": self.nominal_srate,
+            "effective_srate": self.effective_srate,
+            "sample_count": self.sample_count,
+            "gap_count": self.gap_count,
+            "long_gap_count": self.long_gap_count,
+            "missing_sample_count": self.missing_sample_count,
+        }
+
+
+class TimestampDejitterer:
+    """Online de-jittering of timestamps of a regular-rate stream
+
+    Fits a running least-squares line of timestamps over sample indices and returns
+    the fitted timestamps. Statistics are merged chunk-wise (Chan et al.) to stay
+    numerically stable for long recordings. The fit restarts at segment breaks, i.e.
+    intervals longer than `DEJITTER_SEGMENT_MIN_SECONDS` and
+    `DEJITTER_SEGMENT_MIN_SAMPLES` nominal intervals, or backward jumps of the same
+    size. Shorter intervals are considered jitter.
+
+    The fit changes with every chunk. Fitted timestamps are therefore never allowed to
+    decrease within a segment, so they can replace the recorded timestamps.
+    """
+
+    def __init__(self, nominal_srate):
+        self._max_interval = max(
+            DEJITTER_SEGMENT_MIN_SECONDS, DEJITTER_SEGMENT_MIN_SAMPLES / nominal_srate
+        )
+        self._last_timestamp = None
+        self._start_segment()
+
+    def dejitter(self, timestamps):
+        if self._last_timestamp is None:
+            intervals = np.diff(timestamps, prepend=timestamps[0])
+        else:
+            intervals = np.diff(timestamps, prepend=self._last_timestamp)
+        self._last_timestamp = timestamps[-1]
+        break_indices = np.flatnonzero(np.abs(intervals) > self._max_interval)
+        if not break_indices.size:
+            return self._fit(timestamps)
+        segments = np.split(timestamps, break_indices)
+        dejittered = [self._fit(segments[0])] if segments[0].size else []
+        for segment in segments[1:]:
+            self._start_segment()
+            dejittered.append(self._fit(segment))
+        return np.concatenate(dejittered)
+
+    def _start_segment(self):
+        self._origin = None
+        self._last_fitted = None
+        self._count = 0
+        self._mean_index = 0.0
+        self._mean_time = 0.0
+        self._m_index_index = 0.0
+        self._m_index_time = 0.0
+
+    def _fit(self, timestamps):
+        if self._origin is None:
+            self._origin = timestamps[0]
+        indices = np.arange(self._count, self._count + timestamps.size, dtype=float)
+        times = timestamps - self._origin
+
+        chunk_mean_index = indices.mean()
+        chunk_mean_time = times.mean()
+        chunk_m_index_index = np.sum((indices - chunk_mean_index) ** 2)
+        chunk_m_index_time = np.sum(
+            (indices - chunk_mean_index) * (times - chunk_mean_time)
+        )
+        count = self._count + timestamps.size
+        weight = self._count * timestamps.size / count
+        delta_index = chunk_mean_index - self._mean_index
+        delta_time = chunk_mean_time - self._mean_time
+        self._mean_index += delta_index * timestamps.size / count
+        self._mean_time += delta_time * timestamps.size / count
+        self._m_index_index += chunk_m_index_index + delta_index**2 * weight
+        self._m_index_time += chunk_m_index_time + delta_index * delta_time * weight
+        self._count = count
+
+        if self._m_index_index <= 0.0:
+            fitted = timestamps.copy()  # not enough samples for a fit yet
+        else:
+            slope = self._m_index_time / self._m_index_index
+            intercept = self._mean_time - slope * self._mean_index
+            fitted = self._origin + intercept + slope * indices
+        if self._last_fitted is not None:
+            fitted[0] = max(fitted[0], self._last_fitted)
+        fitted = np.maximum.accumulate(fitted)
+        self._last_fitted = fitted[-1]
+        return fitted
+
+
+class WorldFrameTimestamps:
+    """Growing array of the world frame timestamps observed during a recording
+
+    Appended to by the world thread only. Values are written before the count is
+    increased, so readers in other threads always see a consistent prefix.
+    """
+
+    def __init__(self, capacity=2**12):
+        self._buffer = np.empty(capacity, dtype=np.float64)
+        self._count = 0
+
+    @property
+    def timestamps(self):
+        return self._buffer[: self._count]
+
+    def append(self, timestamp):
+        if self._count == self._buffer.size:
+            self._buffer = np.concatenate((self._buffer, np.empty_like(self._buffer)))
+        self._buffer[self._count] = timestamp
+        self._count += 1
+
+
+class WorldIndexMatcher:
+    """Assigns the index of the closest world frame to recorded samples
+
+    Samples newer than the latest observed frame are held back until the next frame
+    arrives, since it might be closer. If frames stall, e.g. because the world camera
+    was disconnected, samples are assigned the latest frame once they are more than
+    `WORLD_INDEX_MAX_HOLD_SECONDS` older than the newest sample. `flush()` assigns the
+    remaining samples once the recording has stopped. Assigns -1 if no frames have been
+    observed.
+    """
+
+    def __init__(self, world_frames):
+        self._world_frames = world_frames
+        self._timestamps = np.empty(0, dtype=np.float64)
+        self._timestamp_rows = []
+        self._data = []
+
+    def match(self, timestamps, timestamp_rows, data):
+        """Returns timestamp rows, data, and world indices of all assignable samples"""
+        self._timestamps = np.concatenate((self._timestamps, timestamps))
+        self._timestamp_rows.extend(timestamp_rows)
+        self._data.extend(data)
+        frames = self._world_frames.timestamps
+        ready_count = self._timestamps.size
+        if frames.size:
+            hold_cutoff = self._timestamps[-1] - WORLD_INDEX_MAX_HOLD_SECONDS
+            is_held = (self._timestamps > frames[-1]) & (
+                self._timestamps >= hold_cutoff
+            )
+            if is_held.any():
+                ready_count = int(np.argmax(is_held))
+        return self._pop(ready_count)
+
+    def flush(self):
+        return self._pop(self._timestamps.size)
+
+    def _pop(self, count):
+        timestamps = self._timestamps[:count]
+        timestamp_rows = self._timestamp_rows[:count]
+        data = self._data[:count]
+        self._timestamps = self._timestamps[count:]
+        del self._timestamp_rows[:count]
+        del self._data[:count]
+        return timestamp_rows, data, self._closest_frames(timestamps)
+
+    def _closest_frames(self, timestamps):
+        frames = self._world_frames.timestamps
+        if not frames.size:
+            return np.full(timestamps.size, -1)
+        right = np.clip(np.searchsorted(frames, timestamps), 0, frames.size - 1)
+        left = np.clip(right - 1, 0, None)
+        is_left_closer = timestamps - frames[left] < frames[right] - timestamps
+        return np.where(is_left_closer, left, right)
+
+
+class StreamIndexWriter:
+    """Writes a sparse timestamp index for a recorded CSV file
+
+    Each entry stores the timestamp, byte offset, and data row number of the first
+    sample of a chunk. Entries are added as soon as `interval_rows` rows or
+    `interval_seconds` seconds have been recorded since the previous entry.
+    """
+
+    def __init__(
+        self,
+        file_path,
+        interval_rows=INDEX_INTERVAL_ROWS,
+        interval_seconds=INDEX_INTERVAL_SECONDS,
+    ):
+        self._file_handle = open(file_path, "wb")
+        self._file_handle.write(INDEX_MAGIC)
+        self._interval_rows = interval_rows
+        self._interval_seconds = interval_seconds
+        self._row_count = 0
+        self._last_entry_row = None
+        self._last_entry_timestamp = None
+
+    def is_due(self, timestamp):
+        if self._last_entry_row is None:
+            return True
+        return (
+            self._row_count - self._last_entry_row >= self._interval_rows
+            or timestamp - self._last_entry_timestamp >= self._interval_seconds
+        )
+
+    def add_entry(self, timestamp, byte_offset):
+        entry = INDEX_ENTRY.pack(timestamp, byte_offset, self._row_count)
+        self._file_handle.write(entry)
+        self._last_entry_row = self._row_count
+        self._last_entry_timestamp = timestamp
+
+    def advance(self, num_rows):
+        self._row_count += num_rows
+
+    def close(self):
+        self._file_handle.close()
@@ -1,5 +1,7 @@
 from .fixations_scene_camera import SceneCameraFixations
+from .fixations_surfaces import SurfaceFixations
 from .gaze_scene_camera import SceneCameraGaze
+from .gaze_surfaces import SurfaceGaze
 from .outlet import Outlet
 from .plugin import Pupil_LSL_Relay
 from .pupillometry_eye_camera import EyeCameraPupillometry
@@ -13,4 +15,6 @@ __all__ = [
     "Pupil_LSL_Relay",
     "SceneCameraGaze",
     "SceneCameraFixations",
+    "SurfaceFixations",
+    "SurfaceGaze",
 ]
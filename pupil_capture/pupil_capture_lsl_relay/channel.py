@@ -142,6 +142,15 @@ def diameter_3d_channels():
     ]
 
 
+def on_surface_channel():
+    return Channel(
+        query=extract_on_surface,
+        label="on_surf",
+        eye="both",
+        metatype="com.pupil-labs.surface.on_surf",
+    )
+
+
 def fixation_id_channel():
     return Channel(
         query=extract_fixation_id,
@@ -245,7 +254,7 @@ def make_extract_diameter_2d(eye):
             else:
                 return np.nan
         else:
-            raise ValueError(f"Unexpected datum: {datum}")
+            raise ValueError(f"Unexpected datum topic: {datum['topic']}")
 
     return extract_diameter_2d
 
@@ -265,7 +274,7 @@ def make_extract_diameter_3d(eye):
             else:
                 return np.nan
         else:
-            raise ValueError(f"Unexpected datum: {datum}")
+            raise ValueError(f"Unexpected datum topic: {datum['topic']}")
 
     return extract_diameter_3d
 
@@ -285,11 +294,19 @@ def make_extract_diameter_3d(eye):
             else:
                 return np.nan
         else:
-            raise ValueError(f"Unexpected datum: {datum}")
+            raise ValueError(f"Unexpected datum topic: {datum['topic']}")
 
     return extract_diameter_3d
 
 
+def extract_on_surface(datum):
+    """Possible `on_surf` field values and their mapping:
+    - `True` -> 1.0
+    - `False` -> 0.0
+    """
+    return 1 if datum["on_surf"] else 0
+
+
 def extract_fixation_id(fixation):
     return fixation["id"]
 
@@ -0,0 +1,97 @@
+"""
+(*)~----------------------------------------------------------------------------------
+ Pupil LSL Relay
+ Copyright (C) 2012 Pupil Labs
+
+ Distributed under the terms of the GNU Lesser General Public License (LGPL v3.0).
+ License details are in the file license.txt, distributed as part of this software.
+----------------------------------------------------------------------------------~(*)
+"""
+import logging
+import time
+from typing import Dict, Optional, Tuple, Type
+
+logger = logging.getLogger(__name__)
+
+LOG_INTERVAL_SECONDS = 10.0
+EXAMPLE_MAX_LENGTH = 500
+
+
+class ChannelExtractionError(Exception):
+    """Raised if the data of a channel cannot be extracted from a sample"""
+
+    def __init__(self, channel_label: str) -> None:
+        super().__init__(channel_label)
+        self.channel_label = channel_label
+
+
+class ErrorGroup:
+    """Counts errors of one type that occurred while extracting a specific channel"""
+
+    def __init__(self, channel_label: str, error_type: Type[Exception]) -> None:
+        self.channel_label = channel_label
+        self.error_type = error_type
+        self.count = 0
+        self.logged_count = 0
+        self.example: Optional[str] = None
+
+    @property
+    def status(self) -> str:
+        return f"{self.count}x {self.error_type.__name__}, e.g. {self.example}"
+
+
+class ErrorAccounting:
+    """Aggregates sample extraction errors of an outlet
+
+    Errors are grouped by channel and exception type. The first error of each group is
+    logged including its traceback and an example sample. Afterwards, new errors are
+    only counted and summarized at most every `log_interval` seconds. This keeps the
+    costs per failing sample constant. Call `log_summary_if_due()` periodically to also
+    log errors that arrived after the last summary.
+    """
+
+    def __init__(
+        self, outlet_name: str, log_interval: float = LOG_INTERVAL_SECONDS
+    ) -> None:
+        self.outlet_name = outlet_name
+        self.groups: Dict[Tuple[str, Type[Exception]], ErrorGroup] = {}
+        self._log_interval = log_interval
+        self._next_summary_time = time.monotonic() + log_interval
+
+    def record(self, channel_label: str, error: Exception, sample):
+        key = channel_label, type(error)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = ErrorGroup(channel_label, type(error))
+            group.example = _truncate(repr(sample))
+            group.logged_count = 1
+            logger.error(
+                f"{self.outlet_name}: Error extracting `{channel_label}` from sample: "
+                f"{group.example}",
+                exc_info=error,
+            )
+        group.count += 1
+        self.log_summary_if_due()
+
+    def log_summary_if_due(self):
+        now = time.monotonic()
+        if now >= self._next_summary_time:
+            self._next_summary_time = now + self._log_interval
+            self.log_summary()
+
+    def log_summary(self):
+        for group in self.groups.values():
+            new_count = group.count - group.logged_count
+            if not new_count:
+                continue
+            logger.warning(
+                f"{self.outlet_name}: {new_count} more {group.error_type.__name__} "
+                f"errors extracting `{group.channel_label}` ({group.count} in total)"
+            )
+            group.logged_count = group.count
+
+
+def _truncate(text: str) -> str:
+    if len(text) <= EXAMPLE_MAX_LENGTH:
+        return text
+    return text[:EXAMPLE_MAX_LENGTH] + "..."
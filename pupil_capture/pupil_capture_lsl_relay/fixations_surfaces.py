@@ -0,0 +1,40 @@
+"""
+(*)~----------------------------------------------------------------------------------
+ Pupil LSL Relay
+ Copyright (C) 2012 Pupil Labs
+
+ Distributed under the terms of the GNU Lesser General Public License (LGPL v3.0).
+ License details are in the file license.txt, distributed as part of this software.
+----------------------------------------------------------------------------------~(*)
+"""
+from .channel import (
+    confidence_channel,
+    fixation_dispersion_channel,
+    fixation_duration_channel,
+    norm_pos_channels,
+    on_surface_channel,
+)
+from .surface_outlet import SurfaceOutlet
+
+
+class SurfaceFixations(SurfaceOutlet):
+    @property
+    def name(self) -> str:
+        return "pupil_capture_surface_fixations"
+
+    @property
+    def surface_data_key(self) -> str:
+        return "fixations_on_surfaces"
+
+    @property
+    def lsl_type(self) -> str:
+        return "Fixations"
+
+    def setup_channels(self):
+        return (
+            confidence_channel(),
+            *norm_pos_channels(coordinate_system="surface"),
+            on_surface_channel(),
+            fixation_dispersion_channel(),
+            fixation_duration_channel(),
+        )
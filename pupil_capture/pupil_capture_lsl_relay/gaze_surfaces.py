@@ -0,0 +1,28 @@
+"""
+(*)~----------------------------------------------------------------------------------
+ Pupil LSL Relay
+ Copyright (C) 2012 Pupil Labs
+
+ Distributed under the terms of the GNU Lesser General Public License (LGPL v3.0).
+ License details are in the file license.txt, distributed as part of this software.
+----------------------------------------------------------------------------------~(*)
+"""
+from .channel import confidence_channel, norm_pos_channels, on_surface_channel
+from .surface_outlet import SurfaceOutlet
+
+
+class SurfaceGaze(SurfaceOutlet):
+    @property
+    def name(self) -> str:
+        return "pupil_capture_surface_gaze"
+
+    @property
+    def surface_data_key(self) -> str:
+        return "gaze_on_surfaces"
+
+    def setup_channels(self):
+        return (
+            confidence_channel(),
+            *norm_pos_channels(coordinate_system="surface"),
+            on_surface_channel(),
+        )
@@ -9,16 +9,19 @@
 """
 import abc
 import logging
-from typing import Optional, Sequence
+from typing import Callable, List, Optional, Sequence
 from uuid import uuid4 as generate_uuid
 
 import pylsl as lsl
 
 from .channel import Channel
+from .error_accounting import ChannelExtractionError, ErrorAccounting
 from .version import VERSION
 
 logger = logging.getLogger(__name__)
 
+LocalConsumer = Callable[[str, List[List[float]], List[float]], None]
+
 
 class Outlet(abc.ABC):
     # concrete functionality to be implemented:
@@ -41,9 +44,11 @@ class Outlet(abc.ABC):
 
     _name_to_type_mapping = {}
 
-    def __init_subclass__(cls, **kwargs) -> None:
+    def __init_subclass__(cls, register: bool = True, **kwargs) -> None:
+        """Registers concrete outlet types; pass `register=False` for base classes"""
         super().__init_subclass__(**kwargs)
-        cls._name_to_type_mapping[cls.type_name()] = cls
+        if register:
+            cls._name_to_type_mapping[cls.type_name()] = cls
 
     @classmethod
     def type_name(cls) -> str:
@@ -65,35 +70,72 @@ class Outlet(abc.ABC):
     def __init__(self, uuid: str) -> None:
         self._uuid = uuid or str(generate_uuid())
         self.channels = self.setup_channels()
+        self.errors = ErrorAccounting(self.name)
+        self._local_consumers: List[LocalConsumer] = []
+        self.setup_lsl_outlets()
+
+    def setup_lsl_outlets(self):
         stream_info = self.construct_streaminfo()
         self._wrapped_outlet = lsl.StreamOutlet(stream_info)
 
     def push_sample(self, sample):
         try:
             channel_data = self.extract_channel_data(sample)
-        except Exception:
-            logger.exception(f"Error extracting sample: {sample}")
+        except ChannelExtractionError as err:
+            self.errors.record(err.channel_label, err.__cause__, sample)
             return
+        timestamp = sample["timestamp"]
         # push_chunk might be more efficient but does not
         # allow to set explicit timstamps for all samples
-        self._wrapped_outlet.push_sample(channel_data, sample["timestamp"])
+        self._wrapped_outlet.push_sample(channel_data, timestamp)
+        for consumer in self._local_consumers:
+            consumer(self.uuid, [channel_data], [timestamp])
+
+    def add_local_consumer(self, consumer: LocalConsumer):
+        """Registers an in-process consumer of the pushed samples
+
+        Consumers are called with the source id, channel data, and timestamps of the
+        pushed samples. This allows other plugins, e.g. the LSL recorder, to receive the
+        data without going through the LSL network stack.
+        """
+        self._local_consumers.append(consumer)
+
+    def remove_local_consumer(self, consumer: LocalConsumer):
+        self._local_consumers.remove(consumer)
+
+    def source_ids(self) -> Sequence[str]:
+        """Source ids of all LSL streams published by this outlet"""
+        return (self.uuid,)
+
+    def stream_info(self, source_id: str) -> lsl.StreamInfo:
+        """Full stream info, including description, of a published stream"""
+        return self._wrapped_outlet.info()
 
     def extract_channel_data(self, sample):
-        return [chan.query(sample) for chan in self.channels]
+        channel_data = []
+        for chan in self.channels:
+            try:
+                channel_data.append(chan.query(sample))
+            except Exception as err:
+                raise ChannelExtractionError(chan.label) from err
+        return channel_data
 
     def construct_streaminfo(self) -> lsl.StreamInfo:
+        return self._construct_streaminfo(self.name, self.uuid)
+
+    def _construct_streaminfo(self, name: str, source_id: str) -> lsl.StreamInfo:
         stream_info = lsl.StreamInfo(
-            name=self.name,
+            name=name,
             type=self.lsl_type,
             channel_count=len(self.channels),
             channel_format=lsl.cf_double64,
-            source_id=self.uuid,
+            source_id=source_id,
         )
         stream_info.desc().append_child_value("pupil_lsl_relay_version", VERSION)
         xml_channels = stream_info.desc().append_child("channels")
         for chan in self.channels:
             chan.append_to(xml_channels)
-        logger.debug(f"Creating {self.name} outlet with stream info:\n{stream_info}")
+        logger.debug(f"Creating {name} outlet with stream info:\n{stream_info}")
         return stream_info
 
     @property
@@ -9,7 +9,7 @@
 """
 
 import logging
-from typing import Iterable, Tuple
+from typing import Iterable, Optional, Tuple
 
 import pylsl as lsl
 from plugin import Plugin
@@ -17,6 +17,7 @@ from pyglui import ui
 from version_utils import parse_version
 
 from .outlet import Outlet
+from .shared_memory import SHARED_MEMORY_AVAILABLE, SharedMemoryTransport
 from .version import VERSION
 
 logger = logging.getLogger(__name__)
@@ -46,6 +47,7 @@ class Pupil_LSL_Relay(Plugin):
         self,
         g_pool,
         previous_outlets: Iterable[Tuple[str, str]] = (),
+        shared_memory_transport: bool = False,
         # kept for backwards compatibility with with previous plugin version's session
         # settings (`# type: ignore` disables code checker warnings):
         outlet_uuid=...,  # type: ignore
@@ -55,6 +57,10 @@ class Pupil_LSL_Relay(Plugin):
             self.icon_chr = "RL"  # no icon custimization available yet
         self.adjust_pupil_to_lsl_time()
         self.setup_outlets(previous_outlets)
+        self._shared_memory_transport: Optional[SharedMemoryTransport] = None
+        self.shared_memory_transport = shared_memory_transport
+        self._error_menu = None
+        self._displayed_error_groups = set()
 
     def adjust_pupil_to_lsl_time(self):
         debug_ts_before = self.g_pool.get_timestamp()
@@ -82,10 +88,38 @@ class Pupil_LSL_Relay(Plugin):
             Outlet.setup(name, uuid) for name, uuid in outlet_config.items()
         ]
 
+    @property
+    def shared_memory_transport(self) -> bool:
+        return self._shared_memory_transport is not None
+
+    @shared_memory_transport.setter
+    def shared_memory_transport(self, enabled: bool):
+        if enabled == self.shared_memory_transport:
+            return
+        if enabled:
+            if not SHARED_MEMORY_AVAILABLE:
+                logger.error("Shared memory transport requires Python 3.8 or newer")
+                return
+            self._shared_memory_transport = SharedMemoryTransport()
+            for outlet in self._outlets:
+                outlet.add_local_consumer(self._shared_memory_transport)
+        else:
+            for outlet in self._outlets:
+                outlet.remove_local_consumer(self._shared_memory_transport)
+            self._shared_memory_transport.close()
+            self._shared_memory_transport = None
+
+    @property
+    def outlets(self) -> Tuple[Outlet, ...]:
+        return tuple(self._outlets or ())
+
     def recent_events(self, events):
         for outlet in self._outlets:
             for sample in events.get(outlet.event_key, ()):
                 outlet.push_sample(sample)
+            outlet.errors.log_summary_if_due()
+        if self._error_menu is not None:
+            self._update_error_menu()
 
     def init_ui(self):
         self.add_menu()
@@ -98,16 +132,60 @@ class Pupil_LSL_Relay(Plugin):
                 "https://github.com/sccn/xdf/wiki/Gaze-Meta-Data"
             )
         )
+        self.menu.append(
+            ui.Switch(
+                "shared_memory_transport",
+                self,
+                label="Shared memory transport for local consumers",
+            )
+        )
+        self.menu.append(
+            ui.Info_Text(
+                "Additionally mirrors all outlets into shared memory ring buffers. "
+                "Consumers on this computer can read them with `shared_memory.py`."
+            )
+        )
         self.menu.append(ui.Info_Text("Available outlets:"))
         for outlet in self._outlets:
             self.menu.append(ui.Info_Text(f"- {outlet.name} ({outlet.lsl_type})"))
+        self._error_menu = ui.Growing_Menu("Sample extraction errors")
+        self._error_menu.collapsed = True
+        self.menu.append(self._error_menu)
+        self._displayed_error_groups.clear()
+        self._update_error_menu()
 
     def deinit_ui(self):
         self.remove_menu()
+        del self._error_menu[:]
+        self._error_menu = None
+
+    def _update_error_menu(self):
+        group_count = sum(len(outlet.errors.groups) for outlet in self._outlets)
+        if group_count == len(self._displayed_error_groups):
+            return
+        for outlet in self._outlets:
+            for group in outlet.errors.groups.values():
+                if group in self._displayed_error_groups:
+                    continue
+                status = ui.Text_Input(
+                    "status",
+                    group,
+                    label=f"{outlet.name}: {group.channel_label}",
+                    setter=lambda _: None,
+                )
+                status.read_only = True
+                self._error_menu.append(status)
+                self._displayed_error_groups.add(group)
 
     def get_init_dict(self):
-        return {"previous_outlets": [(o.type_name(), o.uuid) for o in self._outlets]}
+        return {
+            "previous_outlets": [(o.type_name(), o.uuid) for o in self._outlets],
+            "shared_memory_transport": self.shared_memory_transport,
+        }
 
     def cleanup(self):
+        self.shared_memory_transport = False
+        for outlet in self._outlets:
+            outlet.errors.log_summary()
         del self._outlets[:]
         self._outlets = None
@@ -0,0 +1,186 @@
+"""
+(*)~----------------------------------------------------------------------------------
+ Pupil LSL Relay
+ Copyright (C) 2012 Pupil Labs
+
+ Distributed under the terms of the GNU Lesser General Public License (LGPL v3.0).
+ License details are in the file license.txt, distributed as part of this software.
+----------------------------------------------------------------------------------~(*)
+
+Shared-memory ring buffers for consumers running on the same host as Pupil Capture
+
+This module does not depend on Pupil Capture or pylsl. Consumers can copy it and use
+`SharedMemoryReader` to access the relayed data without going through the LSL network
+stack.
+
+Buffer layout:
+- header: 4 x int64 - magic, capacity (rows), columns per row, total rows written
+- data: capacity x columns float64 - timestamp followed by the outlet's channels
+"""
+import hashlib
+import logging
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None
+
+logger = logging.getLogger(__name__)
+
+SHARED_MEMORY_AVAILABLE = shared_memory is not None
+DEFAULT_CAPACITY = 2**14
+
+_MAGIC = 0x50_4C_53_4C_52_42_31  # "PLSLRB1"
+_HEADER_FIELDS = 4
+_MAGIC_IDX, _CAPACITY_IDX, _COLUMNS_IDX, _WRITE_COUNT_IDX = range(_HEADER_FIELDS)
+_HEADER_SIZE = _HEADER_FIELDS * np.dtype(np.int64).itemsize
+
+
+def shared_memory_name(source_id: str) -> str:
+    """Name of the shared memory block that mirrors the stream with `source_id`
+
+    Hashed to stay within the name length limits of all platforms, e.g. 31 characters
+    on macOS.
+    """
+    return "plsl_" + hashlib.sha1(source_id.encode()).hexdigest()[:16]
+
+
+def _map_buffer(buffer, capacity=None, columns=None):
+    header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=buffer)
+    if capacity is None:
+        if header[_MAGIC_IDX] != _MAGIC:
+            raise ValueError("Shared memory block is not a Pupil LSL ring buffer")
+        capacity = int(header[_CAPACITY_IDX])
+        columns = int(header[_COLUMNS_IDX])
+    rows = np.ndarray(
+        (capacity, columns), dtype=np.float64, buffer=buffer, offset=_HEADER_SIZE
+    )
+    return header, rows
+
+
+class SharedMemoryRingBuffer:
+    """Single-producer ring buffer of timestamped samples in shared memory
+
+    Rows are written before the write counter is advanced. Readers never modify the
+    buffer, so no locking is required.
+    """
+
+    def __init__(
+        self, name: str, channel_count: int, capacity: int = DEFAULT_CAPACITY
+    ) -> None:
+        columns = channel_count + 1
+        size = _HEADER_SIZE + capacity * columns * np.dtype(np.float64).itemsize
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            logger.debug(f"Replacing stale shared memory block {name}")
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self._header, self._rows = _map_buffer(self._shm.buf, capacity, columns)
+        self._header[:] = (_MAGIC, capacity, columns, 0)
+        self._capacity = capacity
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def write(self, samples: Sequence[Sequence[float]], timestamps: Sequence[float]):
+        count = len(timestamps)
+        if not count:
+            return
+        write_count = int(self._header[_WRITE_COUNT_IDX])
+        if count > self._capacity:
+            # only the newest rows fit into the buffer
+            skipped = count - self._capacity
+            samples, timestamps = samples[skipped:], timestamps[skipped:]
+            write_count += skipped
+            count = self._capacity
+        start = write_count % self._capacity
+        first_part = min(count, self._capacity - start)
+        self._rows[start : start + first_part, 0] = timestamps[:first_part]
+        self._rows[start : start + first_part, 1:] = samples[:first_part]
+        if first_part < count:
+            self._rows[: count - first_part, 0] = timestamps[first_part:]
+            self._rows[: count - first_part, 1:] = samples[first_part:]
+        # publish the new rows only after they have been written
+        self._header[_WRITE_COUNT_IDX] = write_count + count
+
+    def close(self):
+        self._header = self._rows = None
+        self._shm.close()
+        self._shm.unlink()
+
+
+class SharedMemoryReader:
+    """Reads samples of a `SharedMemoryRingBuffer` from another process
+
+    `read()` returns zero-copy views into the shared buffer. They remain valid until
+    the producer has written another `capacity` rows; copy them if they need to be
+    kept for longer.
+    """
+
+    def __init__(self, name: str) -> None:
+        try:
+            self._shm = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:  # Python < 3.13, readers must not unlink the block on exit
+            from multiprocessing import resource_tracker
+
+            self._shm = shared_memory.SharedMemory(name=name)
+            resource_tracker.unregister(self._shm._name, "shared_memory")
+        self._header, self._rows = _map_buffer(self._shm.buf)
+        self._capacity = self._rows.shape[0]
+        self._read_count = int(self._header[_WRITE_COUNT_IDX])
+        self.dropped_samples = 0
+
+    @property
+    def channel_count(self) -> int:
+        return self._rows.shape[1] - 1
+
+    def read(self) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns timestamps and samples written since the previous call
+
+        Returns at most the rows up to the end of the ring buffer. Call repeatedly
+        until the returned timestamps are empty to receive all available rows.
+        """
+        write_count = int(self._header[_WRITE_COUNT_IDX])
+        if write_count - self._read_count > self._capacity:
+            overrun_count = write_count - self._capacity
+            self.dropped_samples += overrun_count - self._read_count
+            self._read_count = overrun_count
+        start = self._read_count % self._capacity
+        count = min(write_count - self._read_count, self._capacity - start)
+        self._read_count += count
+        rows = self._rows[start : start + count]
+        return rows[:, 0], rows[:, 1:]
+
+    def close(self):
+        self._header = self._rows = None
+        self._shm.close()
+
+
+class SharedMemoryTransport:
+    """Local outlet consumer mirroring each relayed stream into a ring buffer"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY) -> None:
+        self._capacity = capacity
+        self._buffers: Dict[str, SharedMemoryRingBuffer] = {}
+
+    def __call__(self, source_id, samples, timestamps):
+        buffer = self._buffers.get(source_id)
+        if buffer is None:
+            buffer = SharedMemoryRingBuffer(
+                shared_memory_name(source_id), len(samples[0]), self._capacity
+            )
+            self._buffers[source_id] = buffer
+            logger.debug(f"Opened shared memory block {buffer.name} for {source_id}")
+        buffer.write(samples, timestamps)
+
+    def close(self):
+        for buffer in self._buffers.values():
+            buffer.close()
+        self._buffers.clear()
@@ -0,0 +1,85 @@
+"""
+(*)~----------------------------------------------------------------------------------
+ Pupil LSL Relay
+ Copyright (C) 2012 Pupil Labs
+
+ Distributed under the terms of the GNU Lesser General Public License (LGPL v3.0).
+ License details are in the file license.txt, distributed as part of this software.
+----------------------------------------------------------------------------------~(*)
+"""
+import abc
+import hashlib
+from typing import Dict, Sequence
+
+import pylsl as lsl
+
+from .error_accounting import ChannelExtractionError
+from .outlet import Outlet
+
+
+class SurfaceOutlet(Outlet, register=False):
+    """Base class for outlets publishing surface-mapped data
+
+    Opens one LSL stream per surface as soon as the surface tracker reports it for the
+    first time. All data mapped to a surface within a frame is pushed as one chunk.
+    """
+
+    @property
+    @abc.abstractmethod
+    def surface_data_key(self) -> str:
+        """Key of the mapped data within a `surfaces` event datum"""
+        return NotImplementedError
+
+    @property
+    def event_key(self) -> str:
+        return "surfaces"
+
+    def setup_lsl_outlets(self):
+        self._surface_outlets: Dict[str, lsl.StreamOutlet] = {}
+        self._surface_source_ids: Dict[str, str] = {}
+
+    def push_sample(self, sample):
+        surface_name = sample["name"]
+        mapped_data = sample.get(self.surface_data_key, ())
+        if not mapped_data:
+            return
+        try:
+            channel_data = [self.extract_channel_data(datum) for datum in mapped_data]
+        except ChannelExtractionError as err:
+            self.errors.record(err.channel_label, err.__cause__, sample)
+            return
+        timestamps = [datum["timestamp"] for datum in mapped_data]
+        if surface_name not in self._surface_outlets:
+            self._setup_surface_outlet(surface_name)
+        self._surface_outlets[surface_name].push_chunk(channel_data, timestamps)
+        source_id = self._surface_source_ids[surface_name]
+        for consumer in self._local_consumers:
+            consumer(source_id, channel_data, timestamps)
+
+    def source_ids(self) -> Sequence[str]:
+        return tuple(self._surface_source_ids.values())
+
+    def stream_info(self, source_id: str) -> lsl.StreamInfo:
+        for surface_name, surface_source_id in self._surface_source_ids.items():
+            if surface_source_id == source_id:
+                return self._surface_outlets[surface_name].info()
+        raise ValueError(f"Unknown source id {source_id}")
+
+    def surface_source_id(self, surface_name: str) -> str:
+        """Source id that is stable across sessions and safe to use in file names"""
+        name_hash = hashlib.sha1(surface_name.encode()).hexdigest()[:8]
+        return f"{self.uuid}-{name_hash}"
+
+    def _setup_surface_outlet(self, surface_name: str):
+        source_id = self.surface_source_id(surface_name)
+        stream_info = self._construct_streaminfo(
+            f"{self.name}_{surface_name}", source_id
+        )
+        xml_surface = stream_info.desc().append_child("surface")
+        xml_surface.append_child_value("name", surface_name)
+        xml_surface.append_child_value(
+            "coordinate_system",
+            "normalized (0-1), origin at the bottom left corner of the surface",
+        )
+        self._surface_outlets[surface_name] = lsl.StreamOutlet(stream_info)
+        self._surface_source_ids[surface_name] = source_id